@@ -0,0 +1,33 @@
+import pandas as pd
+import numpy as np
+
+# Target renaming dictionary
+TARGET_RENAME = {
+"cmy": "CMY", "ctxm": "CTX-M", "ent": "IC_en", "ic": "IC_ex", "imp": "IMP",
+"kpc": "KPC", "mcr126": "MCR 1/2/6", "mcr3": "MCR 3", "mcr4": "MCR 4", "mcr5910": "MCR 5/9/10",
+"mcr7": "MCR 7", "mcr8": "MCR 8", "meca": "mecA", "mtb": "MTB", "ndm": "NDM",
+"nuc": "nuc", "oxa": "OXA", "pvl": "pvl", "shv": "SHV", "vana": "van A",
+"vanb": "van B", "vanm": "van M", "vim": "VIM"
+}
+
+
+# Clean the compiled CSV into the typed columns used by the dashboard
+def prepare(csv_path="compiled_data.csv"):
+    df = pd.read_csv(csv_path)
+    # Dates are exported as dd/mm/yyyy (some with trailing spaces); an explicit format avoids per-row format inference
+    df["Date of collection"] = pd.to_datetime(df["Date of collection"].str.strip(), format="%d/%m/%Y", errors='coerce')
+    df["Avg Cq"] = pd.to_numeric(df["Avg Cq"], errors='coerce').fillna(40)
+    copy_number = df["Copy Number"].to_numpy()
+    positive = copy_number > 0
+    df["log Copy Number"] = np.where(positive, np.log10(np.where(positive, copy_number, 1.0)), 0.0)
+    df["Target"] = df["Target"].str.lower().map(TARGET_RENAME).fillna(df["Target"]) # Rename targets
+    df["VRDL ID"] = "VRDL_" + df["VRDL ID"].astype(str)
+    df["Date"] = df["Date of collection"].dt.strftime("%d-%m-%Y") # Display label reused by filters and plots
+    for col in ["VRDL ID", "Date", "Target"]:
+        df[col] = df[col].astype("category") # Filter on integer codes rather than strings
+    return df
+
+
+# Re-run whenever compiled_data.csv is updated
+if __name__ == "__main__":
+    prepare().to_parquet("compiled_data.parquet", compression="zstd", index=False)
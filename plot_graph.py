@@ -4,8 +4,14 @@ import plotly.express as px
 import plotly.graph_objects as go
 import streamlit as st
 import pathlib
-from sklearn.preprocessing import StandardScaler
-from scipy.cluster.hierarchy import linkage, leaves_list
+from scipy.cluster.hierarchy import leaves_list
+from scipy.spatial.distance import pdist
+
+# fastcluster is a faster drop-in for scipy's linkage; fall back to scipy when it is not installed
+try:
+    from fastcluster import linkage
+except ImportError:
+    from scipy.cluster.hierarchy import linkage
 
 # Apply page configuration
 st.set_page_config(layout="wide")
@@ -16,15 +22,6 @@ if css_path.exists():
     with open(css_path) as f:
         st.markdown(f"<style>{f.read()}</style>", unsafe_allow_html=True)
 
-# Target renaming dictionary
-TARGET_RENAME = {
-"cmy": "CMY", "ctxm": "CTX-M", "ent": "IC_en", "ic": "IC_ex", "imp": "IMP",
-"kpc": "KPC", "mcr126": "MCR 1/2/6", "mcr3": "MCR 3", "mcr4": "MCR 4", "mcr5910": "MCR 5/9/10",
-"mcr7": "MCR 7", "mcr8": "MCR 8", "meca": "mecA", "mtb": "MTB", "ndm": "NDM",
-"nuc": "nuc", "oxa": "OXA", "pvl": "pvl", "shv": "SHV", "vana": "van A",
-"vanb": "van B", "vanm": "van M", "vim": "VIM"
-}
-
 # Header section with banner-style layout
 col1, col2, col3 = st.columns([1, 2, 1])
 with col1:
@@ -35,58 +32,102 @@ with col3:
     st.sidebar.image("images/tigs_logo.png", width=120)
 
 
-# Load compiled CSV data
-@st.cache_data
+# Load the typed data written by convert.py
+# cache_resource hands every rerun the same frame instead of unpickling a copy, so it must not be modified in place
+@st.cache_resource
 def load_data():
-    df = pd.read_csv("compiled_data.csv")
-    df["Date of collection"] = pd.to_datetime(df["Date of collection"], dayfirst=True, format='mixed', errors='coerce')
-    df["Avg Cq"] = pd.to_numeric(df["Avg Cq"], errors='coerce').fillna(40)
-    df["log Copy Number"] = df["Copy Number"].apply(lambda x: np.log10(x) if x > 0 else 0)
-    df["Target"] = df["Target"].str.lower().map(TARGET_RENAME).fillna(df["Target"]) # Rename targets
-    df["VRDL ID"] = "VRDL_" + df["VRDL ID"].astype(str)
-    return df
+    return pd.read_parquet("compiled_data.parquet")
+
+# Boolean mask of rows whose categorical column value is one of the selected values
+def isin_codes(column, values):
+    codes = column.cat.categories.get_indexer(values)
+    return np.isin(column.cat.codes.to_numpy(), codes[codes >= 0])
+
+# Standardise each column to zero mean and unit variance (constant columns are left centred)
+def zscore(a):
+    mean = a.mean(axis=0)
+    std = a.std(axis=0)
+    std[std == 0] = 1
+    return (a - mean) / std
+
+# Resolve a multiselect with a "Select All" entry into (selected values, whether every option is selected)
+def resolve_selection(selected, values):
+    if "Select All" in selected:
+        if len(selected) == 1:
+            return values, True
+        selected = [opt for opt in selected if opt != "Select All"]
+    return selected, len(selected) == len(values)
+
+# Sorted sidebar options; categories are already unique, sorted and exclude missing values
+@st.cache_data
+def option_lists(_df):
+    return (_df["VRDL ID"].cat.categories.tolist(),
+            _df["Date"].cat.categories.tolist(),
+            _df["Target"].cat.categories.tolist())
+
+# Ward leaf order of the float32 pivot rows and columns; cached on the pivot contents so only a changed pivot reclusters
+@st.cache_data
+def cluster_order(pivot_bytes, shape):
+    values = np.frombuffer(pivot_bytes, dtype=np.float32).reshape(shape)
+
+    # Scale data for clustering
+    scaled_data = zscore(values)
+
+    # Cluster rows
+    row_linkage = linkage(pdist(np.ascontiguousarray(scaled_data, dtype=np.float64)), method='ward')
+
+    # Cluster columns
+    col_linkage = linkage(pdist(np.ascontiguousarray(zscore(values.T), dtype=np.float64)), method='ward')
+
+    return leaves_list(row_linkage), leaves_list(col_linkage)
+
+# Pivot and cluster the heatmap data; cached on the selections so unrelated reruns skip the clustering
+@st.cache_data
+def build_heatmap(_filtered_df, vrdls, dates, targets, value_type):
+    grouped = _filtered_df.groupby(["Target", "VRDL ID", "Date"], observed=True)[value_type].mean()
+    pivot = grouped.unstack(["VRDL ID", "Date"]).fillna(0)
+    # Label each (VRDL, date) column once instead of building a label for every row
+    pivot.columns = [f"{vrdl} ({date})" for vrdl, date in pivot.columns]
+    pivot = pivot.astype(np.float32) # Halves the clustering buffers and the heatmap payload sent to the browser
+
+    # Cluster rows and columns
+    row_leaves, col_leaves = cluster_order(pivot.values.tobytes(), pivot.shape)
+    ordered_rows = pivot.index[row_leaves]
+    ordered_cols = pivot.columns[col_leaves]
+
+    # Reorder the data
+    clustered_data = pivot.loc[ordered_rows, ordered_cols]
+    # Prepare text labels as strings formatted to one decimal place
+    text_values = np.char.mod("%.1f", clustered_data.values)
+
+    return clustered_data, text_values
 
 df = load_data()
+vrdl_values, date_values, target_values = option_lists(df)
 
 # Sidebar filters
 
 # --- VRDL Select with dynamic "Select All" logic ---
-vrdl_values = sorted(df["VRDL ID"].dropna().unique().tolist())
 selected_vrdls = st.sidebar.multiselect("Select VRDL(s)", options = ["Select All"] + vrdl_values, default=["Select All"])
 
-if "Select All" in selected_vrdls and len(selected_vrdls) > 1:
-    selected_vrdls = [opt for opt in selected_vrdls if opt != "Select All"]
-elif "Select All" in selected_vrdls:
-    selected_vrdls = vrdl_values
+selected_vrdls, all_vrdls = resolve_selection(selected_vrdls, vrdl_values)
 
 # --- Date Select with same logic ---
-date_values = sorted(df["Date of collection"].dt.strftime("%d-%m-%Y").dropna().unique().tolist())
 date_options = ["Select All"] + date_values
 selected_dates = st.sidebar.multiselect("Select Dates", options=date_options, default=["Select All"])
 
-if "Select All" in selected_dates and len(selected_dates) > 1:
-    selected_dates = [opt for opt in selected_dates if opt != "Select All"]
-elif "Select All" in selected_dates:
-    selected_dates = date_values
+selected_dates, all_dates = resolve_selection(selected_dates, date_values)
 
 # --- Target Select ---
-target_values = sorted(df["Target"].dropna().unique().tolist())
 target_options = ["Select All"] + target_values
 selected_targets = st.sidebar.multiselect("Select Target(s)", options=target_options, default=["Select All"])
 
-if "Select All" in selected_targets and len(selected_targets) > 1:
-    selected_targets = [opt for opt in selected_targets if opt != "Select All"]
-elif "Select All" in selected_targets:
-    selected_targets = target_values
+selected_targets, all_targets = resolve_selection(selected_targets, target_values)
 
 
 # Sidebar logic
 # Detect whether all options are selected
-all_selected = (
-    set(selected_vrdls) == set(vrdl_values) and
-    set(selected_dates) == set(date_values) and
-    set(selected_targets) == set(target_values)
-)
+all_selected = all_vrdls and all_dates and all_targets
 
 # Define dynamic options
 plot_options = ["Heatmap"] if all_selected else ["Bar Plot"]
@@ -97,37 +138,27 @@ plot_type = st.sidebar.selectbox("Plot Type", plot_options, key="plot_type")
 value_type = st.sidebar.selectbox("Value", value_options, key="value_type")
 
 
-# Filter data based on selections
-filtered_df = df[(df["VRDL ID"].isin(selected_vrdls)) &
-                 (df["Date of collection"].dt.strftime("%d-%m-%Y").isin(selected_dates)) &
-                 (df["Target"].isin(selected_targets))]
+# Filter data based on selections; rows are only materialised for the columns each view needs
+# With everything selected (the landing page) the full slice is used; otherwise columns with every option selected need no membership test
+if all_selected:
+    mask = slice(None)
+else:
+    mask = np.ones(len(df), dtype=bool)
+    if not all_vrdls:
+        mask &= isin_codes(df["VRDL ID"], selected_vrdls)
+    if not all_dates:
+        mask &= isin_codes(df["Date"], selected_dates)
+    if not all_targets:
+        mask &= isin_codes(df["Target"], selected_targets)
 
 # --- Visualization Section ---
 st.markdown("<div class='section-title'>📊 Visualizations</div>", unsafe_allow_html=True)
 
 
 if plot_type == "Heatmap":
-    filtered_df["VRDL+Date"] = filtered_df["VRDL ID"] + " (" + filtered_df["Date of collection"].dt.strftime("%d-%m-%Y") + ")"
-    pivot = filtered_df.pivot_table(index="Target", columns="VRDL+Date", values=value_type, aggfunc="mean", fill_value=0)
-
-    # Scale data for clustering
-    scaler = StandardScaler()
-    scaled_data = scaler.fit_transform(pivot)
-
-    # Cluster rows
-    row_linkage = linkage(scaled_data, method='ward')
-    row_leaves = leaves_list(row_linkage)
-    ordered_rows = pivot.index[row_leaves]
-
-    # Cluster columns
-    col_linkage = linkage(scaler.fit_transform(pivot.T), method='ward')
-    col_leaves = leaves_list(col_linkage)
-    ordered_cols = pivot.columns[col_leaves]
-
-    # Reorder the data
-    clustered_data = pivot.loc[ordered_rows, ordered_cols]
-    # Prepare text labels as strings (optionally format the numbers)
-    text_values = np.round(clustered_data.values, 1).astype(str)
+    heatmap_df = df.loc[mask, ["VRDL ID", "Date", "Target", value_type]]
+    clustered_data, text_values = build_heatmap(heatmap_df, tuple(selected_vrdls), tuple(selected_dates),
+                                                 tuple(selected_targets), value_type)
 
     # Plot with Plotly
     heatmap = go.Heatmap(
@@ -155,9 +186,10 @@ if plot_type == "Heatmap":
 
 
 elif plot_type == "Bar Plot":
-    bar_df = filtered_df.copy()
-    bar_df["Date"] = bar_df["Date of collection"].dt.strftime("%d-%m-%Y")
     error_y_col = "Cq SD" if value_type == "Avg Cq" else "Copy SD" if value_type == "Copy Number" else None
+    # Only pass plotly the columns it draws
+    bar_cols = ["Target", value_type, "Date", "VRDL ID"] + ([error_y_col] if error_y_col else [])
+    bar_df = df.loc[mask, bar_cols]
 
     fig = px.bar(
         bar_df,
@@ -175,7 +207,27 @@ elif plot_type == "Bar Plot":
     st.plotly_chart(fig, use_container_width=True)
 
 elif plot_type == "Line Plot":
-    line_df = filtered_df.groupby(["Date of collection", "Target"])[value_type].mean().reset_index()
+    # Mean per (date, target) cell via bincount over the categorical codes
+    date_codes = df["Date"].cat.codes.to_numpy()[mask].astype(np.int64)
+    target_codes = df["Target"].cat.codes.to_numpy()[mask]
+    values = df[value_type].to_numpy()[mask]
+    keyed = (date_codes >= 0) & (target_codes >= 0)
+    date_labels = df["Date"].cat.categories
+    target_labels = df["Target"].cat.categories
+    n_cells = len(date_labels) * len(target_labels)
+    cell_keys = date_codes[keyed] * len(target_labels) + target_codes[keyed]
+    values = values[keyed]
+    present = ~np.isnan(values)
+    # Cells whose values are all missing stay in as NaN, as with groupby().mean(), so the line shows a gap
+    cells = np.flatnonzero(np.bincount(cell_keys, minlength=n_cells))
+    sums = np.bincount(cell_keys[present], weights=values[present], minlength=n_cells)[cells]
+    counts = np.bincount(cell_keys[present], minlength=n_cells)[cells]
+    date_idx, target_idx = np.divmod(cells, len(target_labels))
+    line_df = pd.DataFrame({
+        "Date of collection": pd.to_datetime(date_labels[date_idx], format="%d-%m-%Y"),
+        "Target": target_labels[target_idx],
+        value_type: np.divide(sums, counts, out=np.full(len(cells), np.nan), where=counts > 0),
+    }).sort_values(["Date of collection", "Target"], ignore_index=True)
     fig = px.line(line_df, x="Date of collection", y=value_type, color="Target", markers=True, height=800, width=1400)
     fig.update_layout(plot_bgcolor="#F3F3F4", paper_bgcolor="#F3F3F4")
     st.plotly_chart(fig, use_container_width=True)
@@ -184,4 +236,4 @@ elif plot_type == "Line Plot":
 show_table = st.checkbox("Show Filtered Data Table")
 if show_table:
     st.markdown("<div class='section-title'> Filtered Data Table</div>", unsafe_allow_html=True)
-    st.dataframe(filtered_df, use_container_width=True)
+    st.dataframe(df[mask], use_container_width=True)